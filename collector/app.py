@@ -1,78 +1,209 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import ijson
+from pydantic import ValidationError
 from fastapi import FastAPI, Response, Request
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.responses import JSONResponse, ORJSONResponse
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-from datetime import datetime
-from typing import Deque, Tuple
-from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
 
 from models import ActionEvent
-from metrics import (
-    action_duration_seconds,
-    edt_stall_duration_seconds,
-    edt_stalls_total,
-    events_total,
-    heap_delta_bytes,
-)
-
-app = FastAPI(title="Freeze Guard Collector")
-RING: Deque[Tuple[datetime, ActionEvent]] = deque(maxlen=256)
-
-@app.post("/ingest")
-async def ingest(request: Request):
-    raw = await request.body()
-    print(f"[collector] RAW BODY: {raw!r}")  # <-- see exactly what the plugin sent
-
-    # Try to parse JSON no matter what headers say
-    try:
-        data = await request.json()
-    except Exception as ex:
-        return JSONResponse(status_code=400, content={"ok": False, "error": f"json parse: {ex}", "raw": raw.decode("utf-8", "ignore")})
+from metrics import FLUSH_INTERVAL, bounded_action, flush_pending, stage_event
+
+@asynccontextmanager
+async def _lifespan(app):
+    # Drain the microbatch aggregator on a fixed cadence so staged metric
+    # updates land even when nobody is scraping.
+    async def _flusher():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            flush_pending()
+    task = asyncio.create_task(_flusher())
+    yield
+    task.cancel()
+    flush_pending()  # drain the last window so shutdown doesn't drop events
+
+app = FastAPI(title="Freeze Guard Collector", default_response_class=ORJSONResponse,
+              lifespan=_lifespan)
+
+@dataclass(slots=True)
+class _RingEntry:
+    """One ingested event plus its render work done once, at write time."""
+    line: bytes  # preformatted, pre-encoded /report line
+    ts_iso: str  # ISO timestamp, shared by the /report line and /debug
+    ev: ActionEvent
+
+# Preallocated ring of the most recent events. A fixed list plus a growing
+# write index is cheaper than a deque here: appends are a single slot store,
+# and readers slice the last k entries by index math instead of copying the
+# whole deque. Single-worker async serializes mutations on the event loop.
+RING_SIZE = 256  # power of two so `idx & (RING_SIZE - 1)` wraps the index
+_RING_MASK = RING_SIZE - 1
+RING: List[Optional[_RingEntry]] = [None] * RING_SIZE
+RING_IDX = 0  # total events ever written; RING holds the last RING_SIZE
+
+# Opt-in raw-body logging; the repr+print costs more than the rest of the
+# handler at high ingest rates, so keep it off unless debugging.
+DEBUG = os.getenv("FREEZEGUARD_DEBUG") == "1"
+
+# With multiple uvicorn workers each process keeps its own counters, so
+# PROMETHEUS_MULTIPROC_DIR switches /metrics to the aggregating collector
+# that merges all workers. /report and /debug stay per-worker (debug only).
+if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+    from prometheus_client import CollectorRegistry, multiprocess
+    _REGISTRY = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_REGISTRY)
+else:
+    from prometheus_client import REGISTRY as _REGISTRY
+
+@app.exception_handler(RequestValidationError)
+async def _ingest_validation_error(request: Request, exc: RequestValidationError):
+    # Preserve the old contract: a body that isn't JSON at all is a 400 with a
+    # "json parse" error, while schema violations stay FastAPI's default 422.
+    if any("jsondecode" in str(e.get("type", "")) or "json_invalid" in str(e.get("type", ""))
+           for e in exc.errors()):
+        raw = await request.body()
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "json parse: body is not valid JSON", "raw": raw.decode("utf-8", "ignore")},
+        )
+    return await request_validation_exception_handler(request, exc)
+
+# Constant happy-path response, built once; returning a prebuilt Response
+# skips FastAPI's jsonable_encoder/serialization machinery entirely.
+_OK = Response(content=b'{"ok":true}', media_type="application/json")
+
+# /metrics cache: [monotonic render time, rendered bytes]. generate_latest()
+# walks every series, so concurrent scrapers share one render per TTL window;
+# ingest zeroes the timestamp so fresh events are never served stale.
+_METRICS_CACHE = [0.0, b""]
+_METRICS_TTL = 0.5  # seconds
 
-    # Validate with Pydantic (so fields are typed)
+def _record(ev: ActionEvent) -> None:
+    """Update metrics and the ring for one validated event."""
+    global RING_IDX
+
+    # Metrics — bind fields to locals once; pydantic attribute access goes
+    # through Python-level machinery, so repeating it per lookup adds up.
+    # The raw action name stays in the ring for /report and /debug, but the
+    # metric label space is capped to keep series cardinality bounded.
+    raw_action = ev.action
+    action = bounded_action(raw_action)
+    thread = ev.thread.value  # plain str for label tuples and formatting
+    stalls = ev.edt_stalls
+    heap = ev.heap_delta_bytes
+    dur = ev.duration_ms
+    longest = ev.edt_longest_stall_ms
+    # Guard before converting so non-stall events skip the scale entirely
+    # (the > 0 test also subsumes the old max(0.0, ...) clamp).
+    stage_event(action, thread, dur * 1e-3, stalls,
+                longest * 1e-3 if longest > 0.0 else 0.0, heap)
+
+    # Format the /report line once here so reads are a plain join; events are
+    # immutable after ingest, so the string never goes stale.
+    ts = ev.ts
+    if isinstance(ts, datetime):
+        ts_iso = ts.isoformat()
+    else:  # epoch millis from a fast-path sender
+        ts_iso = datetime.fromtimestamp(ts * 1e-3, timezone.utc).isoformat()
+    line = (
+        f"{ts_iso}  {raw_action:<20} {thread}  "
+        f"{dur:7.1f} ms  stalls={stalls} "
+        f"longest={longest:5.1f} ms  heapΔ={heap}"
+    ).encode("utf-8")
+    RING[RING_IDX & _RING_MASK] = _RingEntry(line, ts_iso, ev)
+    RING_IDX += 1
+    _METRICS_CACHE[0] = 0.0  # new data: invalidate the /metrics cache
+
+@app.post("/ingest", response_class=ORJSONResponse)
+async def ingest(ev: ActionEvent, request: Request):
+    if DEBUG:
+        # Body bytes are cached by Starlette once FastAPI has parsed them.
+        print(f"[collector] RAW BODY: {await request.body()!r}")  # <-- see exactly what the plugin sent
+
+    _record(ev)
+    return _OK
+
+@app.post("/ingest_batch", response_class=ORJSONResponse)
+async def ingest_batch(events: List[ActionEvent]):
+    # One HTTP request and one JSON parse amortized over the whole batch;
+    # the loop has no await points, so events land atomically.
+    for ev in events:
+        _record(ev)
+    return ORJSONResponse({"ok": True, "ingested": len(events)})
+
+class _StreamReader:
+    """Minimal async file-like adapter so ijson can pull request.stream()."""
+    __slots__ = ("_chunks",)
+
+    def __init__(self, request: Request):
+        self._chunks = request.stream().__aiter__()
+
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:  # ijson probes read(0) to sniff bytes vs str
+            return b""
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+@app.post("/ingest_stream", response_class=ORJSONResponse)
+async def ingest_stream(request: Request):
+    # Streaming variant of /ingest_batch for very large uploads: events are
+    # parsed and recorded incrementally as chunks arrive, so memory stays
+    # flat instead of buffering the whole body via request.body().
+    count = 0
     try:
-        ev = ActionEvent(**data)
-    except Exception as ex:
-        return JSONResponse(status_code=422, content={"ok": False, "error": f"model: {ex}", "data": data})
-
-    # Metrics
-    secs = ev.duration_ms / 1000.0
-    stall_secs = max(0.0, ev.edt_longest_stall_ms) / 1000.0
-    action_duration_seconds.labels(ev.action, ev.thread).observe(secs)
-    if stall_secs > 0.0:
-        edt_stall_duration_seconds.labels(ev.action).observe(stall_secs)
-    if ev.edt_stalls > 0:
-        edt_stalls_total.labels(ev.action).inc(ev.edt_stalls)
-    events_total.labels(ev.action, ev.thread).inc()
-    
-    # Record heap delta (convert to absolute value for histogram)
-    if ev.heap_delta_bytes != 0:
-        heap_delta_bytes.labels(ev.action, ev.thread).observe(ev.heap_delta_bytes)
+        async for item in ijson.items(_StreamReader(request), "item", use_float=True):
+            _record(ActionEvent.model_validate(item))
+            count += 1
+    except ijson.JSONError as ex:
+        return JSONResponse(status_code=400, content={"ok": False, "error": f"json parse: {ex}", "ingested": count})
+    except ValidationError as ex:
+        return JSONResponse(status_code=422, content={"ok": False, "error": f"model: {ex}", "ingested": count})
+    return ORJSONResponse({"ok": True, "ingested": count})
 
-    RING.append((ev.ts, ev))
-    return {"ok": True}
+@app.get("/healthz")
+@app.head("/healthz")
+def healthz():
+    # Cheap liveness probe; clients can HEAD this instead of pulling the
+    # full /metrics exposition just to see whether the collector is up.
+    return _OK
 
 @app.get("/metrics")
-def metrics():
-    data = generate_latest()
-    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+async def metrics():
+    # async def keeps this on the event loop: a sync handler would run in the
+    # threadpool and race the lifespan flusher over _PENDING. flush_pending()
+    # has no await points, so on the loop it runs atomically with stage_event.
+    now = time.monotonic()
+    if now - _METRICS_CACHE[0] > _METRICS_TTL:
+        flush_pending()  # staged events must land before the render
+        _METRICS_CACHE[1] = generate_latest(_REGISTRY)
+        _METRICS_CACHE[0] = now
+    return Response(content=_METRICS_CACHE[1], media_type=CONTENT_TYPE_LATEST)
 
-@app.get("/report", response_class=PlainTextResponse)
+@app.get("/report")
 def report():
-    lines = []
-    for ts, ev in list(RING)[-50:]:
-        lines.append(
-            f"{ts.isoformat()}  {ev.action:<20} {ev.thread}  "
-            f"{ev.duration_ms:7.1f} ms  stalls={ev.edt_stalls} "
-            f"longest={ev.edt_longest_stall_ms:5.1f} ms  heapΔ={ev.heap_delta_bytes}"
-        )
-    return "\n".join(lines) if lines else "(no events yet)"
+    # Lines are stored pre-encoded, so this is a bytes join straight into the
+    # response body — no per-read formatting or utf-8 encode pass.
+    body = b"\n".join(RING[i & _RING_MASK].line for i in range(max(0, RING_IDX - 50), RING_IDX))
+    return Response(content=body or b"(no events yet)", media_type="text/plain; charset=utf-8")
 
 @app.get("/debug")
 def debug():
     events_list = []
-    for ts, ev in list(RING):
+    for i in range(max(0, RING_IDX - 50), RING_IDX):
+        entry = RING[i & _RING_MASK]
+        ev = entry.ev
         events_list.append({
-            "timestamp": ts.isoformat(),
+            "timestamp": entry.ts_iso,
             "action": ev.action,
             "duration_ms": ev.duration_ms,
             "thread": ev.thread,
@@ -82,7 +213,7 @@ def debug():
         })
     
     return {
-        "total_events": len(RING),
-        "recent_events": events_list[-50:],  # Last 50 events
-        "ring_buffer_size": RING.maxlen
+        "total_events": RING_IDX,  # all events ever ingested, not ring occupancy
+        "recent_events": events_list,  # Last 50 events
+        "ring_buffer_size": RING_SIZE
     }
@@ -1,12 +1,36 @@
 from prometheus_client import Counter, Histogram
 
-# Seconds buckets tuned for UI actions (10ms .. 10s)
-ACTION_DURATION_BUCKETS = (
+# Action names come from user-authored IDE actions, so their cardinality is
+# unbounded; every new value multiplies the series each labelled metric
+# emits. The first MAX_TRACKED_ACTIONS distinct names get their own label
+# value and everything after that folds into OTHER_ACTION, so the series
+# count stays hard-bounded for the life of the process. First-N-wins is
+# deliberate: evicting and re-admitting names would leave every evicted
+# series lingering in Prometheus until restart, unbounding the very thing
+# this cap exists to bound.
+MAX_TRACKED_ACTIONS = 64
+OTHER_ACTION = "__other__"
+_tracked_actions: set = set()
+
+def bounded_action(action: str) -> str:
+    """Map an action name onto the bounded label space for metrics."""
+    tracked = _tracked_actions
+    if action in tracked:
+        return action
+    if len(tracked) < MAX_TRACKED_ACTIONS:
+        tracked.add(action)
+        return action
+    return OTHER_ACTION
+
+# Seconds buckets tuned for UI actions (10ms .. 10s). Both duration
+# histograms share one tuple so their bucket schemas stay aligned, which
+# lets Prometheus recording rules and dashboard queries treat the two
+# interchangeably (and the interpreter share the single tuple object).
+DURATION_BUCKETS = (
     0.010, 0.025, 0.050, 0.100, 0.250, 0.500, 1.0, 2.0, 5.0, 10.0
 )
-STALL_DURATION_BUCKETS = (
-    0.100, 0.250, 0.500, 1.0, 2.0, 5.0
-)
+ACTION_DURATION_BUCKETS = DURATION_BUCKETS
+STALL_DURATION_BUCKETS = DURATION_BUCKETS
 
 action_duration_seconds = Histogram(
     "action_duration_seconds",
@@ -34,9 +58,76 @@ events_total = Counter(
     ["action", "thread"]
 )
 
+# Labelled by action only: thread is already on events_total and
+# action_duration_seconds, and each extra label value multiplies the number
+# of series this 11-bucket histogram emits.
 heap_delta_bytes = Histogram(
     "heap_delta_bytes",
     "Memory allocation delta in bytes per action",
-    ["action", "thread"],
+    ["action"],
     buckets=(-50_000_000, -10_000_000, -1_000_000, -100_000, -10_000, 0, 10_000, 100_000, 1_000_000, 10_000_000, 50_000_000)
 )
+
+# Bound child metrics per (action, thread), resolved once on first sight.
+# .labels(...) goes through a lock and dict lookup inside prometheus_client;
+# caching the children turns each event into one dict .get() plus the
+# observe/inc calls themselves.
+_CHILDREN: dict = {}
+
+def _children(action, thread):
+    key = (action, thread)
+    c = _CHILDREN.get(key)
+    if c is None:
+        c = _CHILDREN[key] = (
+            action_duration_seconds.labels(action, thread),
+            events_total.labels(action, thread),
+            edt_stalls_total.labels(action),
+            edt_stall_duration_seconds.labels(action),
+            heap_delta_bytes.labels(action),
+        )
+    return c
+
+# Microbatch aggregator: every observe/inc takes a lock and (for histograms)
+# scans the bucket bounds, so events are staged here and flushed in one tight
+# loop per (action, thread) — by a periodic task at FLUSH_INTERVAL, and
+# synchronously before a scrape renders, so nothing is ever served stale.
+# Every caller (ingest handlers, the lifespan flusher, the async /metrics
+# handler) runs on the event loop and neither function awaits, so access to
+# _PENDING is serialized without a lock.
+FLUSH_INTERVAL = 0.1  # seconds
+_PENDING: dict = {}  # key -> [durations, stall_durations, stalls, events, heap_deltas]
+
+def stage_event(action, thread, duration_s, stalls, longest_stall_s, heap_delta):
+    """Stage one event's metric updates for the next flush."""
+    p = _PENDING.get((action, thread))
+    if p is None:
+        p = _PENDING[(action, thread)] = [[], [], 0, 0, []]
+    p[0].append(duration_s)
+    if longest_stall_s > 0.0:
+        p[1].append(longest_stall_s)
+    p[2] += stalls
+    p[3] += 1
+    if heap_delta != 0:
+        p[4].append(heap_delta)
+
+def flush_pending():
+    """Apply all staged events to the prometheus metrics."""
+    if not _PENDING:
+        return
+    for (action, thread), (durs, stall_durs, stalls, events, heaps) in _PENDING.items():
+        c = _children(action, thread)
+        observe = c[0].observe
+        for v in durs:
+            observe(v)
+        c[1].inc(events)
+        if stalls > 0:
+            c[2].inc(stalls)
+        if stall_durs:
+            observe = c[3].observe
+            for v in stall_durs:
+                observe(v)
+        if heaps:
+            observe = c[4].observe
+            for v in heaps:
+                observe(v)
+    _PENDING.clear()
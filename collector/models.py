@@ -1,12 +1,28 @@
-from pydantic import BaseModel
-from typing import Literal
+from pydantic import BaseModel, ConfigDict
+from enum import Enum
+from typing import Union
 from datetime import datetime
 
+class Thread(str, Enum):
+    """EDT/BGT for IntelliJ, MAIN/WORKER for VS Code. Enum members are
+    singletons, so label tuples built from them share one interned string
+    per thread type instead of one str per event."""
+    EDT = "EDT"
+    BGT = "BGT"
+    MAIN = "MAIN"
+    WORKER = "WORKER"
+
 class ActionEvent(BaseModel):
+    # Unknown fields from newer plugin versions are dropped instead of
+    # rejected, and validation runs entirely in pydantic-core.
+    model_config = ConfigDict(extra="ignore")
+
     action: str
     duration_ms: float
-    thread: Literal["EDT", "BGT", "MAIN", "WORKER"]  # EDT/BGT for IntelliJ, MAIN/WORKER for VS Code
+    thread: Thread
     heap_delta_bytes: int = 0
     edt_stalls: int = 0
     edt_longest_stall_ms: float = 0.0
-    ts: datetime
+    # Epoch milliseconds preferred (numbers skip the ISO-8601 parse entirely);
+    # ISO strings are still accepted because both IDE plugins send them.
+    ts: Union[float, datetime]
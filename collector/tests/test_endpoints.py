@@ -138,6 +138,47 @@ class TestIngestEndpoint:
         response = client.post("/ingest", json=incomplete_event)
         assert response.status_code == 422  # FastAPI returns 422 for validation errors
 
+    def test_ingest_batch_mock_events(self, client):
+        """Test ingesting a batch of events in one request"""
+        batch = [
+            generate_mock_intellij_event("MOCK_BATCH_INGEST_A"),
+            generate_mock_vscode_event("MOCK_BATCH_INGEST_B"),
+            generate_mock_vscode_event("MOCK_BATCH_INGEST_C"),
+        ]
+
+        response = client.post("/ingest_batch", json=batch)
+        assert response.status_code == 200
+
+        result = response.json()
+        assert result["ok"] is True
+        assert result["ingested"] == 3
+
+        # Batched events should appear in metrics like individual ones
+        metrics_content = client.get("/metrics").text
+        assert 'action="MOCK_BATCH_INGEST_A"' in metrics_content
+        assert 'action="MOCK_BATCH_INGEST_B"' in metrics_content
+
+    def test_ingest_stream_mock_events(self, client):
+        """Test the streaming batch endpoint with a JSON array body"""
+        batch = [
+            generate_mock_intellij_event("MOCK_STREAM_INGEST_A"),
+            generate_mock_vscode_event("MOCK_STREAM_INGEST_B"),
+        ]
+
+        response = client.post(
+            "/ingest_stream",
+            content=json.dumps(batch),
+            headers={"content-type": "application/json"}
+        )
+        assert response.status_code == 200
+
+        result = response.json()
+        assert result["ok"] is True
+        assert result["ingested"] == 2
+
+        metrics_content = client.get("/metrics").text
+        assert 'action="MOCK_STREAM_INGEST_A"' in metrics_content
+
 
 class TestMetricsEndpoint:
     
@@ -173,6 +214,18 @@ class TestMetricsEndpoint:
         assert "action_duration_seconds" in metrics_content
 
 
+class TestHealthEndpoint:
+
+    def test_healthz_supports_cheap_probes(self, client):
+        """Test that /healthz answers both GET and HEAD liveness probes"""
+        response = client.get("/healthz")
+        assert response.status_code == 200
+        assert response.json()["ok"] is True
+
+        head_response = client.head("/healthz")
+        assert head_response.status_code == 200
+
+
 class TestDebugEndpoint:
     
     def test_debug_endpoint_shows_recent_events(self, client):
@@ -209,7 +262,7 @@ def generate_mock_intellij_event(action_name: str) -> dict:
         "heap_delta_bytes": random.randint(1024, 16384),
         "edt_stalls": random.randint(1, 8),
         "edt_longest_stall_ms": round(random.uniform(100.0, 500.0), 3),
-        "ts": datetime.now().isoformat() + "Z"
+        "ts": int(datetime.now().timestamp() * 1000)  # epoch-ms fast path
     }
 
 
@@ -224,5 +277,5 @@ def generate_mock_vscode_event(action_name: str) -> dict:
         "heap_delta_bytes": random.randint(512, 8192),
         "edt_stalls": random.randint(1, 6),
         "edt_longest_stall_ms": round(random.uniform(80.0, 400.0), 3),
-        "ts": datetime.now().isoformat() + "Z"
+        "ts": int(datetime.now().timestamp() * 1000)  # epoch-ms fast path
     }
\ No newline at end of file